@@ -0,0 +1,77 @@
+"""Numba-compiled distance kernels shared by the API and the bus simulator."""
+import math
+from typing import Tuple
+
+import numpy as np
+from numba import njit
+
+EARTH_RADIUS_M = 6371000.0
+DEG2RAD = math.pi / 180.0
+
+# fastmath minus nnan/ninf: nearest_stop_kernel searches from inf and returns it for empty input
+FASTMATH = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+
+@njit(cache=True, fastmath=FASTMATH)
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    a = min(max(a, 0.0), 1.0)  # rounding can push a just outside [0, 1]
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return EARTH_RADIUS_M * c
+
+
+def haversine_m_vec(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Element-wise haversine_m over coordinate arrays (plain NumPy, no JIT needed)."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    a = np.clip(a, 0.0, 1.0)
+    return 2 * EARTH_RADIUS_M * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+@njit(cache=True, fastmath=FASTMATH)
+def equirect_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Equirectangular approximation of haversine_m; within meters at city scale."""
+    dphi = (lat2 - lat1) * DEG2RAD
+    dlambda = (lon2 - lon1) * DEG2RAD * math.cos((lat1 + lat2) * 0.5 * DEG2RAD)
+    return EARTH_RADIUS_M * math.hypot(dphi, dlambda)
+
+
+@njit(cache=True, fastmath=FASTMATH)
+def route_remaining_from_arrays(
+    lats: np.ndarray, lons: np.ndarray, cum: np.ndarray, j: int, to_idx: int, from_lat: float, from_lon: float
+) -> float:
+    """Distance from (from_lat, from_lon) to stop j, then along the loop from stop j to stop to_idx."""
+    n = lats.shape[0]
+    # Partial current segment is at most one inter-stop hop, so the cheap approximation suffices
+    seg_remaining = equirect_m(from_lat, from_lon, lats[j], lons[j])
+    along = cum[to_idx] - cum[j]
+    if along < 0.0:
+        along += cum[n]
+    return seg_remaining + along
+
+
+@njit(cache=True, fastmath=FASTMATH)
+def nearest_stop_kernel(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> Tuple[int, float]:
+    """Return (index, distance_m) of the closest point in lats/lons; (-1, inf) if empty."""
+    best_i, best_d = -1, np.inf
+    for i in range(lats.shape[0]):
+        d = haversine_m(lat, lon, lats[i], lons[i])
+        if d < best_d:
+            best_i, best_d = i, d
+    return best_i, best_d
+
+
+def warmup() -> None:
+    """Compile (or load from cache) every kernel so the first request doesn't pay for it."""
+    lats = np.array([0.0, 0.001])
+    lons = np.array([0.0, 0.001])
+    cum = np.array([0.0, 1.0, 2.0])
+    haversine_m(0.0, 0.0, 0.001, 0.001)
+    equirect_m(0.0, 0.0, 0.001, 0.001)
+    route_remaining_from_arrays(lats, lons, cum, 1, 0, 0.0, 0.0)
+    nearest_stop_kernel(0.0, 0.0, lats, lons)
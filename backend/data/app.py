@@ -1,27 +1,26 @@
 import asyncio
+import gzip
 import json
 import math
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 import contextlib
 
-from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
+import numpy as np
+import orjson
+from scipy.spatial import cKDTree
+
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, ORJSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 
-# ----------- Simple Haversine distance (meters) -----------
-EARTH_RADIUS_M = 6371000.0
-
-def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return EARTH_RADIUS_M * c
+from _kernels import EARTH_RADIUS_M, haversine_m, haversine_m_vec, nearest_stop_kernel, route_remaining_from_arrays
+from _kernels import warmup as warmup_kernels
 
 # ----------- Data Loading -----------
 BASE_DIR = Path(__file__).resolve().parent
@@ -38,30 +37,203 @@ STOPS_BY_ID: Dict[str, Dict[str, Any]] = {}
 ROUTES_BY_ID: Dict[str, Dict[str, Any]] = {}
 STOP_TO_ROUTES: Dict[str, List[str]] = {}
 for route in ROUTES.get("routes", []):
-    ROUTES_BY_ID[route["id"]] = route
+    # Shallow copy so the derived tables below never leak into /api/getRoutes
+    ROUTES_BY_ID[route["id"]] = dict(route)
     for stop in route.get("stops", []):
         STOPS_BY_ID[stop["id"]] = stop
         STOP_TO_ROUTES.setdefault(stop["id"], []).append(route["id"])
+STOP_TO_ROUTE_SET: Dict[str, Set[str]] = {sid: set(rids) for sid, rids in STOP_TO_ROUTES.items()}
+
+# Per-route segment tables: _seg_len[i] is stops[i] -> stops[i+1] (wrapping),
+# _cum_len[k] the distance from stops[0] to stops[k], _cum_len[n] the full loop.
+for route in ROUTES_BY_ID.values():
+    stops = route["stops"]
+    # First occurrence wins, so closed loops (first stop repeated at the end) resolve to the start
+    stop_index: Dict[str, int] = {}
+    for i, s in enumerate(stops):
+        stop_index.setdefault(s["id"], i)
+    route["_stop_index"] = stop_index
+    route["_lats"] = np.array([s["lat"] for s in stops], dtype=np.float64)
+    route["_lons"] = np.array([s["lon"] for s in stops], dtype=np.float64)
+
+# Every segment of every route goes through a single vectorized haversine, then is split back per route
+_route_lats = [r["_lats"] for r in ROUTES_BY_ID.values()]
+_route_lons = [r["_lons"] for r in ROUTES_BY_ID.values()]
+if _route_lats:
+    _all_seg_len = haversine_m_vec(
+        np.concatenate(_route_lats),
+        np.concatenate(_route_lons),
+        np.concatenate([np.roll(la, -1) for la in _route_lats]),
+        np.concatenate([np.roll(lo, -1) for lo in _route_lons]),
+    )
+    _seg_splits = np.split(_all_seg_len, np.cumsum([len(la) for la in _route_lats])[:-1])
+else:
+    _seg_splits = []
+for route, seg_len in zip(ROUTES_BY_ID.values(), _seg_splits):
+    route["_seg_len"] = seg_len
+    route["_cum_len"] = np.concatenate(([0.0], np.cumsum(seg_len)))
+    # Zero-length segments (repeated coordinates) get a huge reciprocal so t saturates at 1
+    route["_inv_seg_len"] = 1.0 / np.maximum(seg_len, 1e-9)
+
+# Struct-of-arrays copy of stop coordinates (radians) for vectorized distance queries
+STOP_IDS = np.array(list(STOPS_BY_ID))
+STOP_LATS = np.array([s["lat"] for s in STOPS_BY_ID.values()], dtype=np.float64)
+STOP_LONS = np.array([s["lon"] for s in STOPS_BY_ID.values()], dtype=np.float64)
+STOP_LATS_RAD = np.radians(STOP_LATS)
+STOP_LONS_RAD = np.radians(STOP_LONS)
+
+# KD-tree over stops projected onto a local tangent plane (meters) centred on the dataset
+PROJ_LAT0_RAD = float(STOP_LATS_RAD.mean()) if len(STOP_IDS) else 0.0
+PROJ_LON0_RAD = float(STOP_LONS_RAD.mean()) if len(STOP_IDS) else 0.0
+PROJ_COS_LAT0 = math.cos(PROJ_LAT0_RAD)
+
+
+def project_xy(lat_rad: Any, lon_rad: Any) -> Tuple[Any, Any]:
+    """Equirectangular projection (meters) around the dataset centre."""
+    x = EARTH_RADIUS_M * PROJ_COS_LAT0 * (lon_rad - PROJ_LON0_RAD)
+    y = EARTH_RADIUS_M * (lat_rad - PROJ_LAT0_RAD)
+    return x, y
+
+
+STOP_TREE = cKDTree(np.column_stack(project_xy(STOP_LATS_RAD, STOP_LONS_RAD))) if len(STOP_IDS) else None
+# Projected candidates re-ranked with exact haversine, guards against projection error
+NEAREST_CANDIDATES = min(4, len(STOP_IDS))
+
+# ----------- Search Index -----------
+# Lowercased names cached once, plus trigram -> positions posting lists for substring search.
+ROUTE_NAME_LC: List[Tuple[str, str, str, str]] = [
+    (r["id"], r["name"], r["name"].lower(), r["id"].lower()) for r in ROUTES.get("routes", [])
+]
+STOP_NAME_LC: List[Tuple[str, str, str]] = [(sid, s["name"], s["name"].lower()) for sid, s in STOPS_BY_ID.items()]
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def build_trigram_index(texts: Iterable[Iterable[str]]) -> Dict[str, Set[int]]:
+    """Map each trigram to the positions whose texts contain it."""
+    index: Dict[str, Set[int]] = defaultdict(set)
+    for pos, entry in enumerate(texts):
+        for text in entry:
+            for g in trigrams(text):
+                index[g].add(pos)
+    return index
+
+
+ROUTE_TRIGRAMS = build_trigram_index((name_lc, id_lc) for _, _, name_lc, id_lc in ROUTE_NAME_LC)
+STOP_TRIGRAMS = build_trigram_index((name_lc,) for _, _, name_lc in STOP_NAME_LC)
+
+
+def trigram_candidates(index: Dict[str, Set[int]], ql: str, size: int) -> Iterable[int]:
+    """Positions that may contain ql, in original order; every position for queries under 3 chars."""
+    if len(ql) < 3:
+        return range(size)
+    postings = sorted((index.get(g, set()) for g in trigrams(ql)), key=len)
+    return sorted(set.intersection(*postings))
+
 
 # ----------- Bus Simulator -----------
 # We simulate one or more buses traveling along their route's sequence of stops.
 # Each bus will move from stop[i] to stop[i+1] at a given speed.
+# Segments of every route are flattened into SEG_* arrays; route k owns
+# SEG_*[ROUTE_SEG_OFFSET[k]:ROUTE_SEG_OFFSET[k] + ROUTE_SEG_COUNT[k]].
+# Routes with fewer than two stops get no segments and their buses stay put.
+
+ROUTE_IDS: List[str] = list(ROUTES_BY_ID)
+ROUTE_INDEX: Dict[str, int] = {rid: k for k, rid in enumerate(ROUTE_IDS)}
+ROUTE_OFFSETS: Dict[str, int] = {}
+_seg_parts: List[Tuple[np.ndarray, ...]] = []
+_offset = 0
+for route in ROUTES_BY_ID.values():
+    ROUTE_OFFSETS[route["id"]] = _offset
+    if len(route["stops"]) < 2:
+        continue
+    lats, lons = route["_lats"], route["_lons"]
+    _seg_parts.append((lats, lons, np.roll(lats, -1), np.roll(lons, -1), route["_seg_len"], route["_inv_seg_len"]))
+    _offset += len(lats)
+SEG_LAT_A, SEG_LON_A, SEG_LAT_B, SEG_LON_B, SEG_LEN, SEG_INV_LEN = (
+    np.concatenate([p[c] for p in _seg_parts]) if _seg_parts else np.zeros(0) for c in range(6)
+)
+ROUTE_SEG_OFFSET = np.array([ROUTE_OFFSETS[rid] for rid in ROUTE_IDS], dtype=np.int64)
+ROUTE_SEG_COUNT = np.array([len(r["stops"]) if len(r["stops"]) >= 2 else 0 for r in ROUTES_BY_ID.values()], dtype=np.int64)
+
+# Per-bus state, one slot per bus (struct-of-arrays)
+# For prototype: one bus per route
+NUM_BUSES = len(ROUTE_IDS)
+BUS_ROUTE_IDX = np.zeros(NUM_BUSES, dtype=np.int64)
+BUS_SEGMENT_INDEX = np.zeros(NUM_BUSES, dtype=np.int64)  # segment from stops[i] -> stops[i+1]
+BUS_PROGRESS_M = np.zeros(NUM_BUSES, dtype=np.float64)  # meters progressed along current segment
+BUS_SPEED_KMPH = np.zeros(NUM_BUSES, dtype=np.float64)
+BUS_SPEED_MPS = np.zeros(NUM_BUSES, dtype=np.float64)  # kept in sync with BUS_SPEED_KMPH
+BUS_LAT = np.full(NUM_BUSES, np.nan)
+BUS_LON = np.full(NUM_BUSES, np.nan)
+BUS_LAST_UPDATE_TS = np.zeros(NUM_BUSES, dtype=np.float64)  # time.monotonic() of last move
+
+# Offset turning time.monotonic() readings into unix timestamps for display
+MONOTONIC_TO_WALL = time.time() - time.monotonic()
+
 
 class BusState:
-    def __init__(self, bus_id: str, route_id: str, speed_kmph: float = 20.0):
+    """View of one bus's slot in the BUS_* arrays."""
+
+    __slots__ = ("index", "bus_id", "route_id", "_iso_ts", "_iso")
+
+    def __init__(self, index: int, bus_id: str, route_id: str, speed_kmph: float = 20.0):
+        self.index = index
         self.bus_id = bus_id
         self.route_id = route_id
+        self._iso_ts = None  # type: Optional[float]
+        self._iso = ""
+        BUS_ROUTE_IDX[index] = ROUTE_INDEX[route_id]
         self.speed_kmph = speed_kmph  # configurable per bus
-        self.segment_index = 0  # index between stops: segment from stops[i] -> stops[i+1]
-        self.progress_m = 0.0  # meters progressed along current segment
-        self.lat = None  # type: Optional[float]
-        self.lon = None  # type: Optional[float]
-        self.last_update_ts = time.time()
+        BUS_SEGMENT_INDEX[index] = 0
+        BUS_PROGRESS_M[index] = 0.0
+        BUS_LAST_UPDATE_TS[index] = time.monotonic()
         # Initialize at first stop
         route = ROUTES_BY_ID[route_id]
         if len(route["stops"]) >= 1:
-            self.lat = route["stops"][0]["lat"]
-            self.lon = route["stops"][0]["lon"]
+            BUS_LAT[index] = route["stops"][0]["lat"]
+            BUS_LON[index] = route["stops"][0]["lon"]
+
+    @property
+    def lat(self) -> Optional[float]:
+        v = float(BUS_LAT[self.index])
+        return None if math.isnan(v) else v
+
+    @property
+    def lon(self) -> Optional[float]:
+        v = float(BUS_LON[self.index])
+        return None if math.isnan(v) else v
+
+    @property
+    def speed_kmph(self) -> float:
+        return float(BUS_SPEED_KMPH[self.index])
+
+    @speed_kmph.setter
+    def speed_kmph(self, value: float) -> None:
+        BUS_SPEED_KMPH[self.index] = value
+        BUS_SPEED_MPS[self.index] = value * 1000.0 / 3600.0
+
+    @property
+    def segment_index(self) -> int:
+        return int(BUS_SEGMENT_INDEX[self.index])
+
+    @property
+    def progress_m(self) -> float:
+        return float(BUS_PROGRESS_M[self.index])
+
+    @property
+    def last_update_ts(self) -> float:
+        return float(BUS_LAST_UPDATE_TS[self.index])
+
+    def last_update_iso(self) -> str:
+        """Wall-clock ISO string of the last move, formatted at most once per tick."""
+        ts = self.last_update_ts
+        if ts != self._iso_ts:
+            self._iso_ts = ts
+            self._iso = datetime.utcfromtimestamp(ts + MONOTONIC_TO_WALL).isoformat() + "Z"
+        return self._iso
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -71,61 +243,168 @@ class BusState:
             "lon": self.lon,
             "speed_kmph": self.speed_kmph,
             "segment_index": self.segment_index,
-            "last_update": datetime.utcfromtimestamp(self.last_update_ts).isoformat() + "Z",
+            "last_update": self.last_update_iso(),
         }
 
 # Initialize simulated buses
-# For prototype: one bus per route
 BUSES: Dict[str, BusState] = {}
-for route in ROUTES.get("routes", []):
-    bus_id = f"{route['id']}-bus-1"
-    BUSES[bus_id] = BusState(bus_id=bus_id, route_id=route["id"], speed_kmph=22.0)
+for k, rid in enumerate(ROUTE_IDS):
+    bus_id = f"{rid}-bus-1"
+    BUSES[bus_id] = BusState(index=k, bus_id=bus_id, route_id=rid, speed_kmph=22.0)
+
+BUS_LIST: List[BusState] = sorted(BUSES.values(), key=lambda b: b.index)
+
+
+def bus_records() -> List[Dict[str, Any]]:
+    """to_dict() for every bus, built column-wise from the BUS_* arrays."""
+    # tolist() unboxes each column in C; NaN positions (empty routes) serialize as null via orjson
+    return [
+        {
+            "bus_id": bus.bus_id,
+            "route_id": bus.route_id,
+            "lat": lat,
+            "lon": lon,
+            "speed_kmph": speed,
+            "segment_index": seg,
+            "last_update": bus.last_update_iso(),
+        }
+        for bus, lat, lon, speed, seg in zip(
+            BUS_LIST, BUS_LAT.tolist(), BUS_LON.tolist(), BUS_SPEED_KMPH.tolist(), BUS_SEGMENT_INDEX.tolist()
+        )
+    ]
+
+
+BUS_ACTIVE = ROUTE_SEG_COUNT[BUS_ROUTE_IDX] > 0  # buses whose route has segments to drive
+
+
+def step_buses_vectorized(dt: float) -> None:
+    """Advance every bus by dt seconds in one vectorized pass over the BUS_* arrays."""
+    active = BUS_ACTIVE
+    if not active.any():
+        return
+    seg_count = ROUTE_SEG_COUNT[BUS_ROUTE_IDX[active]]
+    seg = ROUTE_SEG_OFFSET[BUS_ROUTE_IDX[active]] + BUS_SEGMENT_INDEX[active]
+    seg_len = SEG_LEN[seg]
+
+    # distance moved in this tick
+    progress = BUS_PROGRESS_M[active] + BUS_SPEED_MPS[active] * dt
+    t = np.minimum(progress * SEG_INV_LEN[seg], 1.0)
+
+    # Interpolate position
+    BUS_LAT[active] = SEG_LAT_A[seg] + (SEG_LAT_B[seg] - SEG_LAT_A[seg]) * t
+    BUS_LON[active] = SEG_LON_A[seg] + (SEG_LON_B[seg] - SEG_LON_A[seg]) * t
+    BUS_LAST_UPDATE_TS[active] = time.monotonic()
+
+    # move to next segment
+    done = progress >= seg_len
+    BUS_SEGMENT_INDEX[active] = np.where(done, (BUS_SEGMENT_INDEX[active] + 1) % seg_count, BUS_SEGMENT_INDEX[active])
+    BUS_PROGRESS_M[active] = np.where(done, 0.0, progress)
+
+
+def _make_tick(route: Dict[str, Any]) -> Callable[[BusState, float, float], None]:
+    """Build a tick function specialized to one route's segment tables."""
+    lat_a = route["_lats"].tolist()
+    lon_a = route["_lons"].tolist()
+    lat_b = lat_a[1:] + lat_a[:1]
+    lon_b = lon_a[1:] + lon_a[:1]
+    seg_len = route["_seg_len"].tolist()
+    inv_len = route["_inv_seg_len"].tolist()
+    next_seg = list(range(1, len(lat_a))) + [0]
+
+    def tick(bus: BusState, dt: float, now: float) -> None:
+        k = bus.index
+        i = int(BUS_SEGMENT_INDEX[k])
+        progress = float(BUS_PROGRESS_M[k]) + float(BUS_SPEED_MPS[k]) * dt
+        t = min(progress * inv_len[i], 1.0)
+        BUS_LAT[k] = lat_a[i] + (lat_b[i] - lat_a[i]) * t
+        BUS_LON[k] = lon_a[i] + (lon_b[i] - lon_a[i]) * t
+        BUS_LAST_UPDATE_TS[k] = now
+        if progress >= seg_len[i]:  # move to next segment
+            BUS_SEGMENT_INDEX[k] = next_seg[i]
+            BUS_PROGRESS_M[k] = 0.0
+        else:
+            BUS_PROGRESS_M[k] = progress
+
+    return tick
+
+
+# Routes with fewer than two stops get no tick, so the hot path never checks route length
+for route in ROUTES_BY_ID.values():
+    if len(route["stops"]) >= 2:
+        route["_tick"] = _make_tick(route)
+BUS_TICKS: List[Tuple[Callable[[BusState, float, float], None], BusState]] = [
+    (ROUTES_BY_ID[bus.route_id]["_tick"], bus) for bus in BUS_LIST if "_tick" in ROUTES_BY_ID[bus.route_id]
+]
+
+# Below this many buses, per-bus closures beat the fixed per-call cost of the NumPy ops
+VECTORIZE_MIN_BUSES = 32
+
+
+def step_buses(dt: float) -> None:
+    """Advance every bus by dt seconds."""
+    if NUM_BUSES >= VECTORIZE_MIN_BUSES:
+        step_buses_vectorized(dt)
+        return
+    now = time.monotonic()
+    for tick, bus in BUS_TICKS:
+        tick(bus, dt, now)
+
+
+# Websocket subscribers per bus; each tick's update is encoded once and fanned out
+SUBSCRIBERS: Dict[str, Set[asyncio.Queue]] = {}
+
+
+def publish_updates() -> None:
+    for bus_id, queues in SUBSCRIBERS.items():
+        if not queues:
+            continue
+        payload = bus_update_payload(BUSES[bus_id])
+        for q in queues:
+            offer_latest(q, payload)
+
+
+def offer_latest(q: asyncio.Queue, payload: str) -> None:
+    """Queue payload, dropping a stale one a slow client hasn't picked up yet."""
+    if q.full():
+        q.get_nowait()
+    q.put_nowait(payload)
 
 
 async def simulator_loop():
     """Background task to move all buses along their routes in real time."""
+    dt = 1.0  # seconds per tick
+    loop = asyncio.get_running_loop()
+    # Ticks land on a fixed monotonic schedule, so slow iterations don't accumulate drift
+    next_tick = loop.time() + dt
     while True:
-        start = time.time()
-        for bus in BUSES.values():
-            route = ROUTES_BY_ID.get(bus.route_id)
-            stops = route.get("stops", [])
-            if len(stops) < 2:
-                continue
-
-            # Compute segment endpoints
-            i = bus.segment_index
-            j = (i + 1) % len(stops)
-            a = stops[i]
-            b = stops[j]
-            seg_len_m = haversine_m(a["lat"], a["lon"], b["lat"], b["lon"])
-            # distance moved in this tick
-            speed_mps = (bus.speed_kmph * 1000.0) / 3600.0
-            dt = 1.0  # seconds per tick
-            move = speed_mps * dt
-
-            bus.progress_m += move
-            if seg_len_m > 0:
-                t = min(bus.progress_m / seg_len_m, 1.0)
-            else:
-                t = 1.0
-
-            # Interpolate position
-            bus.lat = a["lat"] + (b["lat"] - a["lat"]) * t
-            bus.lon = a["lon"] + (b["lon"] - a["lon"]) * t
-            bus.last_update_ts = time.time()
-
-            if bus.progress_m >= seg_len_m:  # move to next segment
-                bus.segment_index = j
-                bus.progress_m = 0.0
-
-        # Aim ~1 Hz updates
-        elapsed = time.time() - start
-        await asyncio.sleep(max(0.0, 1.0 - elapsed))
+        step_buses(dt)
+        publish_updates()
+        await asyncio.sleep(max(0.0, next_tick - loop.time()))
+        next_tick += dt
 
 
 # ----------- ETA Calculation -----------
 
+# Bus positions only change once per tick, so repeated ETA queries in between hit this cache.
+# Cleared wholesale once it grows past ETA_CACHE_MAX entries.
+ETA_CACHE_MAX = 4096
+_ETA_CACHE: Dict[Tuple[str, int, float, float, str], float] = {}
+
+
 def route_distance_remaining_m(route_id: str, from_lat: float, from_lon: float, current_segment_index: int, to_stop_id: str) -> float:
+    """Cached wrapper around compute_route_distance_remaining_m."""
+    key = (route_id, current_segment_index, round(from_lat, 6), round(from_lon, 6), to_stop_id)
+    dist = _ETA_CACHE.get(key)
+    if dist is None:
+        if len(_ETA_CACHE) >= ETA_CACHE_MAX:
+            _ETA_CACHE.clear()
+        dist = _ETA_CACHE[key] = compute_route_distance_remaining_m(
+            route_id, from_lat, from_lon, current_segment_index, to_stop_id
+        )
+    return dist
+
+
+def compute_route_distance_remaining_m(route_id: str, from_lat: float, from_lon: float, current_segment_index: int, to_stop_id: str) -> float:
     """
     Approximate distance along route from current bus position to a target stop by:
     - remaining part of current segment
@@ -133,27 +412,14 @@ def route_distance_remaining_m(route_id: str, from_lat: float, from_lon: float,
     Assumes route is circular (wraps around).
     """
     route = ROUTES_BY_ID[route_id]
-    stops = route["stops"]
-    n = len(stops)
-    # find target stop index
-    to_idx = next((idx for idx, s in enumerate(stops) if s["id"] == to_stop_id), None)
+    n = len(route["stops"])
+    to_idx = route["_stop_index"].get(to_stop_id)
     if to_idx is None:
         return float("inf")
-
-    # distance from current position to end of current segment stop
-    i = current_segment_index
-    j = (i + 1) % n
-    seg_remaining = haversine_m(from_lat, from_lon, stops[j]["lat"], stops[j]["lon"]) if n >= 2 else 0.0
-
-    # sum segments from j to to_idx (wrapping)
-    total = seg_remaining
-    idx = j
-    while idx != to_idx:
-        a = stops[idx]
-        b = stops[(idx + 1) % n]
-        total += haversine_m(a["lat"], a["lon"], b["lat"], b["lon"])
-        idx = (idx + 1) % n
-    return total
+    if n < 2:
+        return 0.0
+    j = (current_segment_index + 1) % n
+    return route_remaining_from_arrays(route["_lats"], route["_lons"], route["_cum_len"], j, to_idx, from_lat, from_lon)
 
 
 def eta_seconds(distance_m: float, speed_kmph: float) -> Optional[int]:
@@ -165,12 +431,31 @@ def eta_seconds(distance_m: float, speed_kmph: float) -> Optional[int]:
 
 def nearest_stop(lat: float, lon: float) -> Tuple[str, Dict[str, Any], float]:
     """Return (stop_id, stop_dict, distance_m) closest to given lat/lon."""
-    best_id, best_stop, best_d = None, None, float("inf")
-    for sid, s in STOPS_BY_ID.items():
+    if STOP_TREE is None:
+        return None, None, float("inf")
+    # Coarse pass: a handful of candidates from the KD-tree in projected space
+    _, idx = STOP_TREE.query(project_xy(math.radians(lat), math.radians(lon)), k=NEAREST_CANDIDATES)
+    idx = np.atleast_1d(idx)
+    k, d = nearest_stop_kernel(lat, lon, STOP_LATS[idx], STOP_LONS[idx])
+    sid = str(STOP_IDS[idx[k]])
+    return sid, STOPS_BY_ID[sid], float(d)
+
+
+def stops_within_m(lat: float, lon: float, radius_m: float) -> List[Tuple[str, float]]:
+    """Return [(stop_id, distance_m)] for stops within radius_m of lat/lon, nearest first."""
+    if STOP_TREE is None:
+        return []
+    # Pad the projected radius slightly so edge stops survive the exact haversine filter
+    idx = STOP_TREE.query_ball_point(project_xy(math.radians(lat), math.radians(lon)), r=radius_m * 1.01 + 1.0)
+    hits = []
+    for i in idx:
+        sid = str(STOP_IDS[i])
+        s = STOPS_BY_ID[sid]
         d = haversine_m(lat, lon, s["lat"], s["lon"])
-        if d < best_d:
-            best_id, best_stop, best_d = sid, s, d
-    return best_id, best_stop, best_d
+        if d <= radius_m:
+            hits.append((sid, d))
+    hits.sort(key=lambda h: h[1])
+    return hits
 
 
 def route_path_distance_and_stops(route_id: str, from_stop_id: str, to_stop_id: str) -> Tuple[float, List[str]]:
@@ -178,33 +463,58 @@ def route_path_distance_and_stops(route_id: str, from_stop_id: str, to_stop_id:
     route = ROUTES_BY_ID[route_id]
     stops = route["stops"]
     n = len(stops)
-    idx_from = next((i for i, s in enumerate(stops) if s["id"] == from_stop_id), None)
-    idx_to = next((i for i, s in enumerate(stops) if s["id"] == to_stop_id), None)
+    idx_from = route["_stop_index"].get(from_stop_id)
+    idx_to = route["_stop_index"].get(to_stop_id)
     if idx_from is None or idx_to is None or n < 2:
         return float("inf"), []
-    total = 0.0
-    path: List[str] = []
-    i = idx_from
-    while i != idx_to:
-        a = stops[i]
-        b = stops[(i + 1) % n]
-        total += haversine_m(a["lat"], a["lon"], b["lat"], b["lon"])
-        path.append(b["id"])  # accumulate next stop ids
-        i = (i + 1) % n
-    return total, [from_stop_id] + path
+    cum = route["_cum_len"]
+    total = float(cum[idx_to] - cum[idx_from])
+    if total < 0.0:
+        total += float(cum[n])
+    if idx_to >= idx_from:
+        path = stops[idx_from + 1:idx_to + 1]
+    else:
+        path = stops[idx_from + 1:] + stops[:idx_to + 1]
+    return total, [from_stop_id] + [s["id"] for s in path]
+
+
+FARE_BASE = 10
+FARE_PER_KM = 2
+FARE_TABLE = [FARE_BASE + FARE_PER_KM * km for km in range(512)]
 
 
 def simple_fare(distance_m: float) -> int:
-    """Very simple fare: base 10 + 2 per km (rounded)."""
-    base = 10
-    per_km = 2
-    km = math.ceil(distance_m / 1000.0)
-    return int(base + per_km * km)
+    """Very simple fare: base 10 + 2 per km (rounded up)."""
+    km = int(-(-distance_m // 1000))  # ceil without math.ceil
+    if km < len(FARE_TABLE):
+        return FARE_TABLE[km]
+    return FARE_BASE + FARE_PER_KM * km
 
 
 # ----------- FastAPI App -----------
 
-app = FastAPI(title="Bus Tracker Prototype", version="0.1.0")
+app = FastAPI(title="Bus Tracker Prototype", version="0.1.0", default_response_class=ORJSONResponse)
+
+GZIP_MIN_SIZE = 1024
+
+# Static payloads serialized (and gzipped) once; their handlers just hand back the bytes
+ROUTES_BYTES = orjson.dumps(ROUTES)
+STOPS_BYTES = orjson.dumps({"stops": list(STOPS_BY_ID.values())})
+ROUTES_GZ = gzip.compress(ROUTES_BYTES)
+STOPS_GZ = gzip.compress(STOPS_BYTES)
+
+
+def static_json(request: Request, body: bytes, body_gz: bytes) -> Response:
+    """Serve pre-encoded JSON, pre-compressed when the client accepts gzip."""
+    # GZipMiddleware passes responses that already carry Content-Encoding through untouched
+    if len(body) >= GZIP_MIN_SIZE and "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(
+            content=body_gz,
+            media_type="application/json",
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+        )
+    return Response(content=body, media_type="application/json")
+
 
 app.add_middleware(
     CORSMiddleware,
@@ -213,10 +523,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
 
 
 @app.on_event("startup")
 async def on_startup():
+    warmup_kernels()
     # Start background simulator
     app.state.sim_task = asyncio.create_task(simulator_loop())
 
@@ -231,8 +543,8 @@ async def on_shutdown():
 
 
 @app.get("/api/getRoutes")
-async def get_routes() -> Dict[str, Any]:
-    return ROUTES
+async def get_routes(request: Request) -> Response:
+    return static_json(request, ROUTES_BYTES, ROUTES_GZ)
 
 
 @app.get("/api/getBusLocation")
@@ -242,7 +554,7 @@ async def get_bus_location(bus_id: Optional[str] = Query(None)) -> Any:
         if not bus:
             raise HTTPException(status_code=404, detail="Bus not found")
         return bus.to_dict()
-    return {"buses": [b.to_dict() for b in BUSES.values()]}
+    return ORJSONResponse({"buses": bus_records()})
 
 
 @app.get("/api/getETA")
@@ -276,18 +588,20 @@ async def search(q: str = Query("")) -> Dict[str, Any]:
     routes = []
     stops = []
     if ql:
-        for route in ROUTES.get("routes", []):
-            if ql in route["name"].lower() or ql in route["id"].lower():
-                routes.append({"id": route["id"], "name": route["name"]})
-        for stop in STOPS_BY_ID.values():
-            if ql in stop["name"].lower():
-                stops.append({"id": stop["id"], "name": stop["name"]})
+        for pos in trigram_candidates(ROUTE_TRIGRAMS, ql, len(ROUTE_NAME_LC)):
+            rid, name, name_lc, id_lc = ROUTE_NAME_LC[pos]
+            if ql in name_lc or ql in id_lc:
+                routes.append({"id": rid, "name": name})
+        for pos in trigram_candidates(STOP_TRIGRAMS, ql, len(STOP_NAME_LC)):
+            sid, name, name_lc = STOP_NAME_LC[pos]
+            if ql in name_lc:
+                stops.append({"id": sid, "name": name})
     return {"routes": routes, "stops": stops}
 
 
 @app.get("/api/getStops")
-async def get_stops() -> Dict[str, Any]:
-    return {"stops": list(STOPS_BY_ID.values())}
+async def get_stops(request: Request) -> Response:
+    return static_json(request, STOPS_BYTES, STOPS_GZ)
 
 
 @app.get("/api/planTrip")
@@ -323,11 +637,8 @@ async def plan_trip(
         raise HTTPException(status_code=404, detail="Start stop not found")
 
     # Find common route (in this dataset, stops are unique; try route containing both)
-    candidate_routes = []
-    for rid, route in ROUTES_BY_ID.items():
-        stop_ids = [s["id"] for s in route["stops"]]
-        if resolved_start_stop_id in stop_ids and dest_stop_id in stop_ids:
-            candidate_routes.append(rid)
+    dest_routes = STOP_TO_ROUTE_SET.get(dest_stop_id, set())
+    candidate_routes = [rid for rid in STOP_TO_ROUTES.get(resolved_start_stop_id, ()) if rid in dest_routes]
     if not candidate_routes:
         raise HTTPException(status_code=400, detail="No single route connects start and destination in prototype data")
 
@@ -376,37 +687,49 @@ async def plan_trip(
 
 # ----------- WebSocket for live updates -----------
 
+def bus_update_payload(bus: BusState) -> str:
+    """JSON-encoded bus_update message for one bus."""
+    # Next stop is end of current segment
+    route = ROUTES_BY_ID[bus.route_id]
+    stops = route["stops"]
+    n = len(stops)
+    target_stop = stops[(bus.segment_index + 1) % n]
+    dist_m = route_distance_remaining_m(
+        route_id=bus.route_id,
+        from_lat=bus.lat,
+        from_lon=bus.lon,
+        current_segment_index=bus.segment_index,
+        to_stop_id=target_stop["id"],
+    )
+    eta_s = eta_seconds(dist_m, bus.speed_kmph)
+    return orjson.dumps({
+        "type": "bus_update",
+        "bus": bus.to_dict(),
+        "next_stop": {"id": target_stop["id"], "name": target_stop["name"]},
+        "distance_m": int(dist_m),
+        "eta_seconds": eta_s,
+    }).decode()
+
+
 @app.websocket("/ws/bus/{bus_id}")
 async def ws_bus(websocket: WebSocket, bus_id: str):
     await websocket.accept()
+    bus = BUSES.get(bus_id)
     try:
-        while True:
-            bus = BUSES.get(bus_id)
-            if not bus:
+        if not bus:
+            while True:
                 await websocket.send_json({"error": "Bus not found"})
                 await asyncio.sleep(2)
-                continue
-            # Next stop is end of current segment
-            route = ROUTES_BY_ID[bus.route_id]
-            stops = route["stops"]
-            n = len(stops)
-            target_stop = stops[(bus.segment_index + 1) % n]
-            dist_m = route_distance_remaining_m(
-                route_id=bus.route_id,
-                from_lat=bus.lat,
-                from_lon=bus.lon,
-                current_segment_index=bus.segment_index,
-                to_stop_id=target_stop["id"],
-            )
-            eta_s = eta_seconds(dist_m, bus.speed_kmph)
-            await websocket.send_json({
-                "type": "bus_update",
-                "bus": bus.to_dict(),
-                "next_stop": {"id": target_stop["id"], "name": target_stop["name"]},
-                "distance_m": int(dist_m),
-                "eta_seconds": eta_s,
-            })
-            await asyncio.sleep(1)
+        # Sized 1: a client only ever needs the latest update
+        q: asyncio.Queue = asyncio.Queue(maxsize=1)
+        q.put_nowait(bus_update_payload(bus))
+        SUBSCRIBERS.setdefault(bus_id, set()).add(q)
+        try:
+            while True:
+                # Sent as text frames; the frontend JSON.parses ev.data directly
+                await websocket.send_text(await q.get())
+        finally:
+            SUBSCRIBERS[bus_id].discard(q)
     except WebSocketDisconnect:
         return
 
@@ -424,3 +747,9 @@ async def index():
     if index_path.exists():
         return FileResponse(str(index_path))
     return {"message": "Frontend not found. Make sure the frontend directory exists."}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")